@@ -10,42 +10,93 @@ import os
 import sys
 import argparse
 import json
+import operator
 import hashlib
+import itertools
 import re
-from typing import List, Dict, Any, Optional
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter
 from dotenv import load_dotenv
 
+# orjson is optional; fall back to the standard library decoder without it
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Translation table mapping characters that are invalid in filenames to underscores
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '\\/*?:"<>|'})
+
+# Matches the 11-character video ID in youtube.com watch, embed and shorts URLs
+# and in youtu.be URLs; the lookarounds reject other hosts, longer IDs and
+# playlist embeds (/embed/videoseries); the first v= parameter wins, as with parse_qs
+_VIDEO_ID_RE = re.compile(
+    r'(?<![\w-])(?:youtube\.com/(?:watch\?(?:[^#\s]*?&)??v=|embed/(?!videoseries)|shorts/)|youtu\.be/)'
+    r'([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])'
+)
+
+# Matches any character that cannot appear in a video ID
+_VIDEO_ID_UNSAFE_RE = re.compile(r'[^A-Za-z0-9_-]')
+
+# Pulls the text out of a transcript segment
+_segment_text = operator.itemgetter('text')
+
 class YouTubeTranscriptionExtractor:
     """Class to extract transcriptions from YouTube videos."""
     
-    def __init__(self):
-        self.formatter = TextFormatter()
+    def __init__(self, pool_size: int = 16):
+        # Reuse keep-alive connections to youtube.com across oEmbed requests;
+        # size the pool to the number of concurrent callers
+        self.session = requests.Session()
+        # Retry connect errors and transient server errors briefly; read timeouts
+        # are not retried so a stalled response costs a single read timeout, and
+        # Retry-After is ignored so a 503 cannot make a worker sleep indefinitely
+        retry = Retry(total=2, read=0, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504],
+                      respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        # Video IDs that oEmbed reported as private, deleted or otherwise unavailable.
+        # main() never looks up the same ID twice, so this only spares library
+        # callers that reuse the extractor a repeated request
+        self.unavailable_ids = set()
+        # Guards unavailable_ids when several worker threads share the extractor
+        self._lock = threading.Lock()
     
     def extract_video_id(self, url: str) -> str:
         """Extract the video ID from a YouTube URL."""
-        if "youtu.be" in url:
-            return url.split("/")[-1].split("?")[0]
-        elif "youtube.com/watch" in url:
-            import urllib.parse as urlparse
-            parsed_url = urlparse.urlparse(url)
-            return urlparse.parse_qs(parsed_url.query)['v'][0]
-        else:
+        match = _VIDEO_ID_RE.search(url)
+        if not match:
             raise ValueError(f"Could not extract video ID from URL: {url}")
+        return match.group(1)
     
     def get_video_info(self, video_id: str) -> Dict[str, Any]:
         """Get video title and channel name using YouTube's oEmbed API."""
+        # Don't ask again for a video that oEmbed already refused in this run
+        with self._lock:
+            unavailable = video_id in self.unavailable_ids
+        if unavailable:
+            return {"title": f"YouTube Video {video_id}", "author": "YouTube Creator"}
+        
         try:
             # Use YouTube's oEmbed API to get video information
             oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-            response = requests.get(oembed_url, timeout=10)
+            response = self.session.get(oembed_url, timeout=(3, 5))
+            # These mean the video is private, deleted or invalid, so asking again won't help
+            if response.status_code in (400, 401, 403, 404):
+                with self._lock:
+                    self.unavailable_ids.add(video_id)
             response.raise_for_status()
-            data = response.json()
+            data = _json_loads(response.content)
             
             # Extract title and author (channel name)
             title = data.get('title', f"YouTube Video {video_id}")
@@ -61,12 +112,20 @@ class YouTubeTranscriptionExtractor:
         """Get the transcript for a YouTube video."""
         try:
             video_id = self.extract_video_id(url)
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            formatted_transcript = self.formatter.format_transcript(transcript)
-            return formatted_transcript
         except Exception as e:
             print(f"Error extracting transcript for {url}: {e}")
             return None
+        return self.get_transcript_by_id(video_id)
+    
+    def get_transcript_by_id(self, video_id: str) -> Optional[str]:
+        """Get the transcript for an already extracted YouTube video ID."""
+        try:
+            transcript = YouTubeTranscriptApi.get_transcript(video_id)
+            # Same output as TextFormatter, without its per-cue Python loop
+            return '\n'.join(map(_segment_text, transcript))
+        except Exception as e:
+            print(f"Error extracting transcript for {video_id}: {e}")
+            return None
 
 
 class TranscriptFileManager:
@@ -75,22 +134,27 @@ class TranscriptFileManager:
     def __init__(self, output_dir: str):
         """Initialize with the output directory."""
         self.output_dir = output_dir
+        # Output directory with a trailing separator, so file paths are a plain concatenation
+        self._dir_prefix = os.path.join(output_dir, '')
         # Create the output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         # Keep track of processed video IDs to avoid duplicates in a single run
         self.processed_ids = set()
+        # Guards processed_ids and _existing_ids, which worker threads update
+        self._lock = threading.Lock()
+        # Scan the output directory once instead of once per video
+        self._existing_ids = self._scan_existing_ids()
     
     def sanitize_filename(self, text: str) -> str:
         """Sanitize text for use in a filename."""
-        # Replace invalid filename characters with underscores
-        sanitized = re.sub(r'[\\/*?:"<>|]', '_', text)
-        # Limit length to avoid excessively long filenames
-        return sanitized[:100] if len(sanitized) > 100 else sanitized
+        # Replace invalid filename characters with underscores and limit length
+        # to avoid excessively long filenames
+        return text.translate(_SANITIZE_TABLE)[:100]
     
     def generate_filename(self, video_id: str, title: str = None, author: str = None) -> str:
         """Generate a unique filename for a video using its ID, author, and title."""
         # Ensure the video ID is valid for a filename
-        safe_id = ''.join(c for c in video_id if c.isalnum() or c in '-_')
+        safe_id = _VIDEO_ID_UNSAFE_RE.sub('', video_id)
         
         if author and title:
             # Sanitize the author name
@@ -107,48 +171,130 @@ class TranscriptFileManager:
     
     def file_exists(self, video_id: str) -> bool:
         """Check if a file already exists for this video ID, regardless of title."""
-        # Look for any file that starts with the video ID
-        pattern = f"{video_id}_*.md"
-        simple_pattern = f"{video_id}.md"
-        
-        # Check for files with the pattern video_id_*.md or just video_id.md
-        for filename in os.listdir(self.output_dir):
-            if filename.startswith(f"{video_id}_") or filename == simple_pattern:
-                return True
-        
-        return False
+        with self._lock:
+            return video_id in self._existing_ids
+    
+    def _scan_existing_ids(self) -> set:
+        """Collect every video ID that may own a file in the output directory."""
+        existing_ids = set()
+        # Files are named video_id.md or video_id_author_title.md, and video IDs
+        # may themselves contain underscores, so record every prefix that ends
+        # right before an underscore as a candidate ID
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                filename = entry.name
+                if filename.endswith('.md'):
+                    existing_ids.add(filename[:-3])
+                index = filename.find('_')
+                while index != -1:
+                    existing_ids.add(filename[:index])
+                    index = filename.find('_', index + 1)
+        return existing_ids
     
     def is_duplicate(self, video_id: str) -> bool:
         """Check if this video ID has already been processed in this run."""
-        return video_id in self.processed_ids
+        with self._lock:
+            return video_id in self.processed_ids
+    
+    def mark_processed(self, video_id: str) -> bool:
+        """Mark a video ID as processed in this run, returning False if it already was."""
+        with self._lock:
+            if video_id in self.processed_ids:
+                return False
+            self.processed_ids.add(video_id)
+            return True
+    
+    def remove_other_files(self, video_id: str, keep: str) -> None:
+        """Remove transcript files for this video ID other than the one named keep."""
+        safe_id = _VIDEO_ID_UNSAFE_RE.sub('', video_id)
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                filename = entry.name
+                if filename == keep or not filename.endswith('.md'):
+                    continue
+                if filename == f"{safe_id}.md" or filename.startswith(f"{safe_id}_"):
+                    os.remove(entry.path)
     
-    def save_transcript(self, video_id: str, url: str, video_info: Dict[str, Any], transcript: str) -> str:
-        """Save a transcript to a file."""
+    def save_transcript(self, video_id: str, url: str, video_info: Dict[str, Any], transcript: str,
+                        replace_existing: bool = False) -> str:
+        """Save a transcript to a file, optionally replacing any older file for the same video."""
         # Mark this video ID as processed
-        self.processed_ids.add(video_id)
+        with self._lock:
+            self.processed_ids.add(video_id)
+            had_file = video_id in self._existing_ids
         
-        # Generate filename from video ID, title, and author
-        filename = self.generate_filename(video_id, video_info['title'], video_info['author'])
-        file_path = os.path.join(self.output_dir, filename)
+        # Generate filename from video ID, title, and author; without metadata
+        # the file is simply named after the video ID
+        title = video_info.get('title')
+        author = video_info.get('author')
+        filename = self.generate_filename(video_id, title, author)
+        file_path = self._dir_prefix + filename
         
         # Format the content with title, author, URL, and transcript
-        content = f"# {video_info['title']}\n"
-        content += f"Author: {video_info['author']}\n\n"
-        content += f"URL: {url}\n\n"
-        content += transcript
+        parts = [
+            f"# {title or f'YouTube Video {video_id}'}\n",
+            f"Author: {author or 'YouTube Creator'}\n\n",
+            f"URL: {url}\n\n",
+            transcript,
+        ]
+        payload = ''.join(parts).encode('utf-8')
         
-        # Write the content to the file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # Write the encoded content to the file in a single call
+        with open(file_path, 'wb') as f:
+            f.write(payload)
+        
+        # The old file may be named differently, e.g. when metadata was skipped
+        # or the title changed, so remove it rather than leaving both behind
+        if replace_existing and had_file:
+            self.remove_other_files(video_id, filename)
+        
+        # Keep the cached directory listing in sync with what is on disk
+        with self._lock:
+            self._existing_ids.add(video_id)
         
         return file_path
 
 
-def process_urls_from_file(file_path: str) -> List[str]:
-    """Read URLs from a file, one URL per line."""
-    with open(file_path, 'r') as f:
-        urls = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
-    return urls
+def process_urls_from_file(file_path: str) -> Iterator[str]:
+    """Yield URLs from a file, one URL per line."""
+    # Undecodable bytes are replaced so a bad line fails like any other invalid URL
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def process_one(video_id: str, url: str, extractor: YouTubeTranscriptionExtractor,
+                file_manager: TranscriptFileManager, args: argparse.Namespace) -> str:
+    """Process a single video and return its status: 'success', 'skipped' or 'failed'."""
+    try:
+        print(f"Processing: {url}")
+        
+        # Check if the file already exists
+        if file_manager.file_exists(video_id) and not args.overwrite:
+            if args.skip_existing:
+                print(f"Skipping: Transcript for video ID {video_id} already exists")
+                return 'skipped'
+            else:
+                print(f"Warning: Transcript for video ID {video_id} already exists. Use --overwrite to replace it.")
+        
+        # Get the transcript
+        transcript = extractor.get_transcript_by_id(video_id)
+        
+        if transcript:
+            # Get video info, unless the caller opted out of the oEmbed round-trip
+            video_info = {} if args.no_metadata else extractor.get_video_info(video_id)
+            
+            # Save the transcript to a file
+            file_path = file_manager.save_transcript(video_id, url, video_info, transcript,
+                                                     replace_existing=args.overwrite)
+            
+            print(f"Saved transcript to: {file_path}")
+            return 'success'
+    except Exception as e:
+        print(f"Error processing {url}: {e}")
+    return 'failed'
 
 
 def main():
@@ -159,66 +305,64 @@ def main():
     parser.add_argument('--output-dir', type=str, default='transcripts', help='Directory to save transcript files')
     parser.add_argument('--skip-existing', action='store_true', help='Skip videos that already have transcript files')
     parser.add_argument('--overwrite', action='store_true', help='Overwrite existing transcript files')
+    parser.add_argument('--no-metadata', action='store_true', help='Skip fetching video title and author; files are named after the video ID (with --overwrite, older titled files for the video are replaced)')
+    parser.add_argument('--workers', type=int, default=8, help='Number of videos to process in parallel')
     
     args = parser.parse_args()
     
-    # Get URLs from arguments or file
-    urls = []
+    if args.workers < 1:
+        print("Error: --workers must be at least 1.")
+        sys.exit(1)
+    
+    # Get URLs from arguments or file; both are consumed lazily
     if args.urls:
-        urls = [url.strip() for url in args.urls.split(',')]
+        urls = (url.strip() for url in args.urls.split(','))
     elif args.file:
         urls = process_urls_from_file(args.file)
     else:
         print("Error: No URLs provided. Use --urls or --file argument.")
         sys.exit(1)
     
-    if not urls:
+    first_url = next(urls, None)
+    if first_url is None:
         print("No valid URLs found.")
         sys.exit(1)
+    urls = itertools.chain([first_url], urls)
     
     # Initialize the transcript extractor and file manager
-    extractor = YouTubeTranscriptionExtractor()
+    extractor = YouTubeTranscriptionExtractor(pool_size=args.workers)
     file_manager = TranscriptFileManager(args.output_dir)
     
-    # Process each URL
-    success_count = 0
-    skipped_count = 0
-    duplicate_count = 0
-    
-    for url in urls:
-        try:
-            print(f"Processing: {url}")
-            video_id = extractor.extract_video_id(url)
+    # Resolve, de-duplicate and dispatch each URL as it is read. The network
+    # calls dominate, so threads overlap them well; at most two jobs per
+    # worker are kept in flight so queued work does not grow with the input.
+    results = Counter()
+    pending = set()
+    max_pending = args.workers * 2
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for url in urls:
+            try:
+                video_id = extractor.extract_video_id(url)
+            except ValueError as e:
+                print(f"Error processing {url}: {e}")
+                continue
             
             # Check if this video ID has already been processed in this run
-            if file_manager.is_duplicate(video_id):
-                print(f"Skipping: Duplicate URL for video ID {video_id}")
-                duplicate_count += 1
+            if not file_manager.mark_processed(video_id):
+                print(f"Skipping: Duplicate URL {url} for video ID {video_id}")
+                results['duplicate'] += 1
                 continue
             
-            # Check if the file already exists
-            if file_manager.file_exists(video_id) and not args.overwrite:
-                if args.skip_existing:
-                    print(f"Skipping: Transcript for video ID {video_id} already exists")
-                    skipped_count += 1
-                    continue
-                else:
-                    print(f"Warning: Transcript for video ID {video_id} already exists. Use --overwrite to replace it.")
-            
-            # Get the transcript
-            transcript = extractor.get_transcript(url)
-            
-            if transcript:
-                # Get video info
-                video_info = extractor.get_video_info(video_id)
-                
-                # Save the transcript to a file
-                file_path = file_manager.save_transcript(video_id, url, video_info, transcript)
-                
-                print(f"Saved transcript to: {file_path}")
-                success_count += 1
-        except Exception as e:
-            print(f"Error processing {url}: {e}")
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.update(future.result() for future in done)
+            pending.add(executor.submit(process_one, video_id, url, extractor, file_manager, args))
+        
+        results.update(future.result() for future in pending)
+    
+    success_count = results['success']
+    skipped_count = results['skipped']
+    duplicate_count = results['duplicate']
     
     print(f"Completed: {success_count} videos processed successfully, {skipped_count} skipped, {duplicate_count} duplicates.")
     print(f"Transcripts saved to: {os.path.abspath(args.output_dir)}")